@@ -1,92 +1,136 @@
 import os
 import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from azure.cosmos import CosmosClient, exceptions as cosmos_exceptions
 from azure.storage.blob import BlobServiceClient
 from azure.core.exceptions import AzureError
 import azure.functions as func
+from shared_code.storage import pooled_transport
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_WORKERS = 16       # concurrent stats JSON downloads
+UPSERT_WORKERS = 8          # concurrent Cosmos DB upserts
+CONNECTION_POOL_SIZE = 32   # HTTP connections kept open to Blob Storage and Cosmos DB
+COSMOS_REQUEST_TIMEOUT = 30 # seconds before a Cosmos DB request times out
+
+# Clients are cached across invocations so connections are reused
+_cosmos_client = None
+_cosmos_containers = {}
+_blob_service_client = None
+_client_lock = threading.Lock()
+
+def get_cosmos_container(database_name: str, container_name: str):
+    """Return a cached Cosmos DB container client, creating the client on first use"""
+    global _cosmos_client
+    with _client_lock:
+        if _cosmos_client is None:
+            # Bound request time and size the connection pool for the concurrent upserts
+            _cosmos_client = CosmosClient(os.environ['CosmosDBEndpoint'], os.environ['CosmosDBKey'],
+                                          connection_timeout=COSMOS_REQUEST_TIMEOUT,
+                                          transport=pooled_transport(CONNECTION_POOL_SIZE))
+        key = (database_name, container_name)
+        if key not in _cosmos_containers:
+            database = _cosmos_client.get_database_client(database_name)
+            _cosmos_containers[key] = database.get_container_client(container_name)
+        return _cosmos_containers[key]
+
+def get_blob_service_client() -> BlobServiceClient:
+    """Return the cached Blob Service Client, creating it on first use"""
+    global _blob_service_client
+    with _client_lock:
+        if _blob_service_client is None:
+            # Size the connection pool for the concurrent downloads
+            _blob_service_client = BlobServiceClient.from_connection_string(
+                os.environ['AzureWebJobsStorage'],
+                transport=pooled_transport(CONNECTION_POOL_SIZE)
+            )
+    return _blob_service_client
+
+def download_json(container_client, blob_name: str) -> dict:
+    """Download and parse a stats JSON blob"""
+    logger.info(f"Processing blob: {blob_name}")
+    blob_client = container_client.get_blob_client(blob_name)
+    return json.loads(blob_client.download_blob().readall())
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
-        # Get environment variables
-        endpoint = os.environ['CosmosDBEndpoint']
-        key = os.environ['CosmosDBKey']
-        blob_connection_string = os.environ['AzureWebJobsStorage']
-
-        # Initialize Cosmos DB client
-        client = CosmosClient(endpoint, key)
-        database_name = "traffic-analysis"  
-        container_name = "video_stats"
-
         # Get database and container references
-        database = client.get_database_client(database_name)
-        container = database.get_container_client(container_name)
+        container = get_cosmos_container("traffic-analysis", "video_stats")
 
-        # Initialize Blob Storage client
-        blob_service_client = BlobServiceClient.from_connection_string(blob_connection_string)
-        container_client = blob_service_client.get_container_client("processed-stats")
+        # Get Blob Storage container
+        container_client = get_blob_service_client().get_container_client("processed-stats")
 
         processed_count = 0
         error_count = 0
         time_offset = 0.0 
-        blobs = container_client.list_blobs()
-
-        for blob in blobs:
-            if not blob.name.endswith(".json"):
-                continue
-
-            try:
-                logger.info(f"Processing blob: {blob.name}")
-
-                # Download and parse JSON
-                blob_client = container_client.get_blob_client(blob)
-                json_data = json.loads(blob_client.download_blob().readall())
-
-                for vehicle in json_data["vehicles"]:
-                    # Extract numeric clip number from filename (e.g., "split_000_stats.json" → 0)
-                    clip_number = blob.name.replace("split_", "").replace("_stats.json", "")
-
-                    # Unique vehicle ID
-                    vehicle["id"] = f"{clip_number}_{vehicle['id']}"
-
-                    # Ensure timestamp is a float
-                    vehicle["timestamp"] = float(vehicle["timestamp"]) + time_offset
-
-                # Prepare Cosmos DB document
-                document = {
-                    "id": json_data["video_name"].replace(".mp4", ""),
-                    "video_name": json_data["video_name"],
-                    "partitionKey": json_data["video_name"],
-                    "processing_time": json_data["processing_time"],
-                    "total_vehicles": json_data["total_vehicles"],
-                    "vehicles": json_data["vehicles"],  # List of vehicle dicts
-                    "video_metadata": json_data["video_metadata"]
-                }
-
-                # Upsert to Cosmos DB
-                container.upsert_item(document)
-                processed_count += 1
-                logger.info(f"Successfully processed {blob.name}")
-
-                # Update time offset for the next split
-                time_offset += json_data.get("video_metadata", {}).get("duration", 0.0)
-
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON in {blob.name}: {str(e)}")
-                error_count += 1
-            except cosmos_exceptions.CosmosHttpResponseError as e:
-                logger.error(f"Cosmos DB error with {blob.name}: {str(e)}")
-                error_count += 1
-            except AzureError as e:
-                logger.error(f"Azure Storage error with {blob.name}: {str(e)}")
-                error_count += 1
-            except Exception as e:
-                logger.error(f"Unexpected error with {blob.name}: {str(e)}")
-                error_count += 1
+        blob_names = [blob.name for blob in container_client.list_blobs() if blob.name.endswith(".json")]
+
+        # Download JSON concurrently and upsert each document as soon as it is ready,
+        # so blob downloads overlap with Cosmos DB writes
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as downloader, \
+                ThreadPoolExecutor(max_workers=UPSERT_WORKERS) as uploader:
+            downloads = [downloader.submit(download_json, container_client, name) for name in blob_names]
+            upserts = {}
+
+            # Consume downloads in listing order: time offsets accumulate clip by clip
+            for blob_name, download in zip(blob_names, downloads):
+                try:
+                    json_data = download.result()
+
+                    for vehicle in json_data["vehicles"]:
+                        # Extract numeric clip number from filename (e.g., "split_000_stats.json" → 0)
+                        clip_number = blob_name.replace("split_", "").replace("_stats.json", "")
+
+                        # Unique vehicle ID
+                        vehicle["id"] = f"{clip_number}_{vehicle['id']}"
+
+                        # Ensure timestamp is a float
+                        vehicle["timestamp"] = float(vehicle["timestamp"]) + time_offset
+
+                    # Prepare Cosmos DB document
+                    document = {
+                        "id": json_data["video_name"].replace(".mp4", ""),
+                        "video_name": json_data["video_name"],
+                        "partitionKey": json_data["video_name"],
+                        "processing_time": json_data["processing_time"],
+                        "total_vehicles": json_data["total_vehicles"],
+                        "vehicles": json_data["vehicles"],  # List of vehicle dicts
+                        "video_metadata": json_data["video_metadata"]
+                    }
+
+                    # Upsert to Cosmos DB (the SDK retries throttled 429 responses itself)
+                    upserts[uploader.submit(container.upsert_item, document)] = blob_name
+
+                    # Update time offset for the next split
+                    time_offset += json_data.get("video_metadata", {}).get("duration", 0.0)
+
+                except json.JSONDecodeError as e:
+                    logger.error(f"Invalid JSON in {blob_name}: {str(e)}")
+                    error_count += 1
+                except AzureError as e:
+                    logger.error(f"Azure Storage error with {blob_name}: {str(e)}")
+                    error_count += 1
+                except Exception as e:
+                    logger.error(f"Unexpected error with {blob_name}: {str(e)}")
+                    error_count += 1
+
+            for future in as_completed(upserts):
+                blob_name = upserts[future]
+                try:
+                    future.result()
+                    processed_count += 1
+                    logger.info(f"Successfully processed {blob_name}")
+                except cosmos_exceptions.CosmosHttpResponseError as e:
+                    logger.error(f"Cosmos DB error with {blob_name}: {str(e)}")
+                    error_count += 1
+                except Exception as e:
+                    logger.error(f"Unexpected error with {blob_name}: {str(e)}")
+                    error_count += 1
 
         return func.HttpResponse(
             json.dumps({
@@ -3,29 +3,23 @@ import logging
 import os
 import tempfile
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from azure.storage.blob import BlobServiceClient
+from shared_code.storage import pooled_transport
 from .processing import process_video_clip
-import numpy as np
-
-class NumpyEncoder(json.JSONEncoder):
-    """ Custom encoder for numpy data types """
-    def default(self, obj):
-        if isinstance(obj, (np.int_, np.intc, np.intp, np.int8,
-                          np.int16, np.int32, np.int64, np.uint8,
-                          np.uint16, np.uint32, np.uint64)):
-            return int(obj)
-        elif isinstance(obj, (np.float_, np.float16, np.float32, 
-                            np.float64)):
-            return float(obj)
-        elif isinstance(obj, (np.ndarray,)):
-            return obj.tolist()
-        return json.JSONEncoder.default(self, obj)
+import orjson
 
 # Configuration
 INPUT_CONTAINER = "splitted-videos"
 OUTPUT_CONTAINER = "processed-stats"
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AzureWebJobsStorage")
+MAX_WORKERS = min(8, os.cpu_count() or 1)  # videos processed concurrently
+CONNECTION_POOL_SIZE = 32          # HTTP connections kept open to Blob Storage
+DOWNLOAD_CONCURRENCY = 4           # parallel range requests per video download
+CONNECTION_TIMEOUT = 20            # seconds to establish a Blob Storage connection
+READ_TIMEOUT = 120                 # seconds to wait on a Blob Storage socket read
 
 # Speed limits (km/h)
 SPEED_LIMITS = {
@@ -34,14 +28,44 @@ SPEED_LIMITS = {
     "emergency": 130
 }
 
+# Storage clients are cached across invocations so the HTTP connection pool is reused
+_blob_service = None
+_output_container = None
+_client_lock = threading.Lock()
+
+def get_blob_service() -> BlobServiceClient:
+    """Return the shared Blob Service Client, creating it on first use"""
+    global _blob_service
+    with _client_lock:
+        if _blob_service is None:
+            # Size the connection pool for concurrent downloads/uploads
+            _blob_service = BlobServiceClient.from_connection_string(
+                AZURE_STORAGE_CONNECTION_STRING,
+                transport=pooled_transport(CONNECTION_POOL_SIZE,
+                                           connection_timeout=CONNECTION_TIMEOUT,
+                                           read_timeout=READ_TIMEOUT)
+            )
+    return _blob_service
+
+def get_output_container():
+    """Return the output container client, creating the container on first use"""
+    global _output_container
+    blob_service = get_blob_service()
+    with _client_lock:
+        if _output_container is None:
+            container_client = blob_service.get_container_client(OUTPUT_CONTAINER)
+            if not container_client.exists():
+                container_client.create_container()
+                logging.info(f"Created container {OUTPUT_CONTAINER}")
+            _output_container = container_client
+    return _output_container
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """HTTP trigger function to process all split videos"""
     logging.info("HTTP trigger function processing all videos in container")
     
     try:
-        # Initialize Blob Service Client
-        blob_service = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service.get_container_client(INPUT_CONTAINER)
+        container_client = get_blob_service().get_container_client(INPUT_CONTAINER)
         
         if not container_client.exists():
             return func.HttpResponse(
@@ -49,43 +73,24 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 status_code=404
             )
 
-        # Process each video in the container
+        # Process the videos in the container concurrently
         processed_files = []
         failed_files = []
-        
-        for blob in container_client.list_blobs():
-            if not blob.name.endswith(".mp4"):
-                continue
-
-            logging.info(f"Processing video: {blob.name}")
-            
-            try:
-                # Download blob to temp file
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_file:
-                    blob_client = container_client.get_blob_client(blob.name)
-                    download_stream = blob_client.download_blob()
-                    tmp_file.write(download_stream.readall())
-                    tmp_path = tmp_file.name
-
-                # Process video with enhanced tracking
-                results = process_video_clip(tmp_path)
-                
-                if not results or len(results.get("vehicles", [])) == 0:
-                    logging.warning(f"No vehicles detected in {blob.name}")
-                    continue
-
-                # Generate and save stats (using custom encoder)
-                stats = generate_stats(blob.name, results)
-                save_stats_to_blob(stats, blob.name)
-                processed_files.append(blob.name)
-                
-                # Clean up
-                os.remove(tmp_path)
-
-            except Exception as e:
-                logging.error(f"Failed to process {blob.name}: {str(e)}", exc_info=True)
-                failed_files.append(blob.name)
-                continue
+        blob_names = [blob.name for blob in container_client.list_blobs() if blob.name.endswith(".mp4")]
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(process_blob, container_client, blob_name): blob_name
+                for blob_name in blob_names
+            }
+            for future in as_completed(futures):
+                blob_name = futures[future]
+                try:
+                    if future.result():
+                        processed_files.append(blob_name)
+                except Exception as e:
+                    logging.error(f"Failed to process {blob_name}: {str(e)}", exc_info=True)
+                    failed_files.append(blob_name)
 
         # Prepare response
         response = {
@@ -110,57 +115,59 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500
         )
 
-def generate_stats(video_name: str, results: dict) -> dict:
-    """Generate summary stats: only cars and trucks, no duplicates per vehicle ID, keep highest speed"""
-    
-    def convert_numpy_types(obj):
-        if isinstance(obj, np.generic):
-            return obj.item()
-        elif isinstance(obj, dict):
-            return {k: convert_numpy_types(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_numpy_types(v) for v in obj]
-        return obj
-
-    # Map from vehicle ID -> vehicle with highest speed
-    vehicle_map = {}
-
-    for vehicle in results["vehicles"]:
-        vehicle_id = vehicle.get("id")
-        vehicle_type = vehicle.get("type")
-        
-        if vehicle_type not in ["car", "truck"]:
-            continue  # Skip other types
+def process_blob(container_client, blob_name: str) -> bool:
+    """Download, process and save stats for one video. Returns False if no vehicles were detected"""
+    logging.info(f"Processing video: {blob_name}")
+
+    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
+    try:
+        # Stream blob to temp file using parallel ranged downloads
+        with tmp_file:
+            blob_client = container_client.get_blob_client(blob_name)
+            download_stream = blob_client.download_blob(max_concurrency=DOWNLOAD_CONCURRENCY)
+            download_stream.readinto(tmp_file)
 
-        # If not seen before OR this one is faster → keep it
-        existing = vehicle_map.get(vehicle_id)
-        if not existing or vehicle["speed"] > existing["speed"]:
-            vehicle_map[vehicle_id] = vehicle
+        # Process video with enhanced tracking
+        results = process_video_clip(tmp_file.name)
 
-    # Convert to final deduplicated list
-    unique_vehicles = [convert_numpy_types(v) for v in vehicle_map.values()]
+        if not results or len(results.get("vehicles", [])) == 0:
+            logging.warning(f"No vehicles detected in {blob_name}")
+            return False
+
+        # Generate and save stats
+        stats = generate_stats(blob_name, results)
+        save_stats_to_blob(stats, blob_name)
+        return True
+
+    finally:
+        # Clean up
+        os.remove(tmp_file.name)
+
+def generate_stats(video_name: str, results: dict) -> dict:
+    """Generate summary stats: only cars and trucks (process_video_clip already keeps one record per vehicle)"""
+    unique_vehicles = [v for v in results["vehicles"] if v.get("type") in ("car", "truck")]
 
     stats = {
         "video_name": video_name,
         "processing_time": datetime.utcnow().isoformat(),
         "total_vehicles": len(unique_vehicles),
         "vehicles": unique_vehicles,
-        "video_metadata": convert_numpy_types(results.get("video_properties", {}))
+        "video_metadata": results.get("video_properties", {})
     }
 
-    logging.info(f"Generated deduplicated stats for {video_name}: {json.dumps(stats, cls=NumpyEncoder, indent=2)}")
+    logging.info("Generated deduplicated stats for %s: %d vehicles", video_name, len(unique_vehicles))
     return stats
 
 
+def serialize_stats(stats: dict) -> bytes:
+    """Serialize stats to compact JSON; numpy scalars and arrays are encoded natively by orjson"""
+    return orjson.dumps(stats, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
 def save_stats_to_blob(stats: dict, original_blob_name: str):
     """Save statistics to output container with error handling"""
     try:
-        blob_service = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service.get_container_client(OUTPUT_CONTAINER)
-        
-        if not container_client.exists():
-            container_client.create_container()
-            logging.info(f"Created container {OUTPUT_CONTAINER}")
+        container_client = get_output_container()
 
         # Generate blob names
         base_name = os.path.splitext(os.path.basename(original_blob_name))[0]
@@ -168,7 +175,7 @@ def save_stats_to_blob(stats: dict, original_blob_name: str):
         # Save as JSON
         json_blob_name = f"{base_name}_stats.json"
         json_client = container_client.get_blob_client(json_blob_name)
-        json_client.upload_blob(json.dumps(stats, indent=2), overwrite=True)
+        json_client.upload_blob(serialize_stats(stats), overwrite=True)
         
         logging.info(f"Saved stats for {original_blob_name} to {OUTPUT_CONTAINER}")
 
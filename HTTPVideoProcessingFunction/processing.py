@@ -3,7 +3,9 @@ import numpy as np
 from datetime import datetime
 import logging
 import os
-from collections import defaultdict
+import queue
+import threading
+from collections import deque
 
 # ---------- Logging Configuration ----------
 logger = logging.getLogger(__name__)
@@ -26,18 +28,77 @@ MAX_SPEED_THRESHOLD = 200          # km/h - maximum plausible speed
 PIXELS_DASHED_LINE = 245
 # pixel to meter conversion factor
 PIXELS_PER_METER = PIXELS_DASHED_LINE / DASHED_LINE_DISTANCE 
+# pixels/second to km/h conversion factor
+SPEED_SCALE = 3.6 / PIXELS_PER_METER
 SPEED_SMOOTHING_WINDOW = 3         # number of frames to average speed over
+POSITION_HISTORY = 32              # positions kept per vehicle for direction estimation
 CONFIDENCE = 0.6                  # confidence threshold for car/truck detection
+NMS_THRESHOLD = 0.4                # IoU above which overlapping detections are suppressed
+ANALYSIS_FPS = 10                  # target analysed frames per second; the others are only grabbed
+YOLO_INPUT_SIZE = (416, 416)       # network input resolution
+DETECTION_BATCH_SIZE = 8           # frames per YOLO forward pass
+PIPELINE_DEPTH = 2                 # batches queued between pipeline stages
+MOTION_THRESHOLD = 0.005           # foreground fraction below which a frame skips YOLO
+MOTION_WARMUP = ANALYSIS_FPS       # analysed frames always detected while the background model settles
+# COCO classes tracked as vehicles: car (2) and truck (7)
+CLASS_MASK = np.zeros(80, dtype=bool)
+CLASS_MASK[[2, 7]] = True
+
+# ---------- OpenCV Runtime ----------
+# Keep the optimized (SIMD) code paths on and share the cores between the host's
+# Python worker processes, so concurrent workers do not oversubscribe the CPU
+def _worker_process_count() -> int:
+    """FUNCTIONS_WORKER_PROCESS_COUNT as a positive int, defaulting to 1 when unset or invalid"""
+    try:
+        return max(1, int(os.environ.get("FUNCTIONS_WORKER_PROCESS_COUNT", "1")))
+    except ValueError:
+        return 1
+
+
+cv2.setUseOptimized(True)
+cv2.setNumThreads(max(1, (os.cpu_count() or 1) // _worker_process_count()))
+
+# ---------- Detection Matching ----------
+def match_detections(centroids: np.ndarray, last_positions: np.ndarray, frame_time: float) -> np.ndarray:
+    """
+    Greedily match detection centroids to tracked vehicles
+    Args:
+        centroids: (N,2) array of detection centers
+        last_positions: (M,3) array of (x, y, time) of each tracked vehicle
+        frame_time: Current video time in seconds
+    Returns:
+        (N,) array with the matched row of last_positions per detection, or -1
+    """
+    matches = np.full(len(centroids), -1, dtype=np.intp)
+    if len(centroids) == 0 or len(last_positions) == 0:
+        return matches
+
+    # Squared distance matrix between detections (rows) and vehicles (cols), with
+    # ineligible pairs (stale track or 100 px or more away) masked out as inf
+    dx = centroids[:, None, 0] - last_positions[None, :, 0]
+    dy = centroids[:, None, 1] - last_positions[None, :, 1]
+    dists = dx * dx + dy * dy
+    dists[:, frame_time - last_positions[:, 2] >= 1.0] = np.inf
+    dists[dists >= 100 ** 2] = np.inf
+
+    # Nearest still-unmatched vehicle, in detection order
+    for i in range(len(centroids)):
+        j = int(np.argmin(dists[i]))
+        if np.isfinite(dists[i, j]):
+            matches[i] = j
+            dists[:, j] = np.inf
+    return matches
+
 
 # ---------- Vehicle Tracker Class ----------
 class VehicleTracker:
     def __init__(self):
         """Initialize vehicle tracker with empty structures"""
         self.tracked_vehicles = {}  # Active vehicles being tracked
-        self.available_ids = set()   # Reusable vehicle IDs
         self.next_id = 1             # Next available new ID
-        self.alerted_vehicles = {}   # Track last alert time per vehicle
-        self.max_speeds = {}         # Track maximum speed per vehicle
+        # Columnar state of the active vehicles, one row per vehicle
+        self.track_ids = np.empty(0, dtype=np.int64)      # Vehicle ID of each row
+        self.last_positions = np.empty((0, 3))            # Last (x, y, time) of each row
 
     def update(self, detections, frame_time, frame_height):
         """
@@ -49,53 +110,41 @@ class VehicleTracker:
         Returns:
             List of vehicle results with max speeds
         """
-        updated_vehicles = {}
         results = []
 
-        # Mark all existing vehicles as unmatched at start of update
-        for vehicle_id, vehicle in self.tracked_vehicles.items():
-            vehicle['matched'] = False
+        centroids = np.array([(x + w // 2, y + h // 2) for x, y, w, h, _, _ in detections], dtype=np.float64).reshape(-1, 2)
+        matches = match_detections(centroids, self.last_positions, frame_time)
 
-        for x, y, w, h, conf, class_id in detections:
-            cx, cy = x + w // 2, y + h // 2
+        # Instantaneous speed of every matched detection in one pass (NaN when unmatched)
+        matched = matches >= 0
+        prev = self.last_positions[matches[matched]]
+        pixels = np.hypot(centroids[matched, 0] - prev[:, 0], centroids[matched, 1] - prev[:, 1])
+        t_elapsed = frame_time - prev[:, 2]
+        speeds = np.full(len(detections), np.nan)
+        speeds[matched] = np.divide(pixels, t_elapsed, out=np.full_like(pixels, np.nan), where=t_elapsed > 0) * SPEED_SCALE
 
-            matched_id = None
-            min_dist = float('inf')
-            for vid, v in self.tracked_vehicles.items():
-                if v['matched']:
-                    continue
-                lx, ly, lt = v['last_position']
-                dist = np.hypot(cx - lx, cy - ly)
-                if (frame_time - lt < 1.0) and dist < 100 and dist < min_dist:
-                    matched_id = vid
-                    min_dist = dist
+        track_ids = self.track_ids.tolist()
+        new_ids = []
+        for (x, y, w, h, conf, class_id), j, speed_kmh in zip(detections, matches, speeds.tolist()):
+            cx, cy = x + w // 2, y + h // 2
+            conf = float(conf)
+            matched_id = track_ids[j] if j >= 0 else None
 
             if matched_id is not None:
                 v = self.tracked_vehicles[matched_id]
-                v['matched'] = True
-                if v['positions']:
-                    px, py, pt = v['positions'][-1]
-                    pixels = np.hypot(cx - px, cy - py)
-                    t_elapsed = frame_time - pt
-                    if t_elapsed > 0:
-                        meters = pixels / PIXELS_PER_METER
-                        speed_kmh = (meters / t_elapsed) * 3.6
-                        if MIN_SPEED_THRESHOLD < speed_kmh < MAX_SPEED_THRESHOLD:
-                            v['speed_history'].append(speed_kmh)
-                            if len(v['speed_history']) > SPEED_SMOOTHING_WINDOW:
-                                v['speed_history'].pop(0)
-                            v['speed'] = sum(v['speed_history']) / len(v['speed_history'])
-
-                            if v['speed'] > 130 and not v.get('alerted', False):
-                                logger.warning(
-                                    f"[SPEED ALERT] Vehicle ID {matched_id} ({v['type']}) exceeded 130 km/h: "
-                                    f"{v['speed']:.1f} km/h at time {frame_time:.2f}s, position=({cx},{cy})"
-                                )
-                                v['alerted'] = True  # Mark alerted
-
-                v['last_position'] = (cx, cy, frame_time)
+                if MIN_SPEED_THRESHOLD < speed_kmh < MAX_SPEED_THRESHOLD:
+                    v['speed_history'].append(speed_kmh)
+                    v['speed'] = sum(v['speed_history']) / len(v['speed_history'])
+
+                    if v['speed'] > 130 and not v.get('alerted', False):
+                        logger.warning(
+                            "[SPEED ALERT] Vehicle ID %s (%s) exceeded 130 km/h: "
+                            "%.1f km/h at time %.2fs, position=(%d,%d)",
+                            matched_id, v['type'], v['speed'], frame_time, cx, cy
+                        )
+                        v['alerted'] = True  # Mark alerted
+
                 v['positions'].append((cx, cy, frame_time))
-                updated_vehicles[matched_id] = v
 
                 if 'speed' in v and len(v['positions']) >= 3:
                     dx = v['positions'][-1][0] - v['positions'][0][0]
@@ -119,53 +168,275 @@ class VehicleTracker:
                 # Always assign a new unique ID without reuse
                 new_id = self.next_id
                 self.next_id += 1
-                updated_vehicles[new_id] = {
+                new_ids.append(new_id)
+                self.tracked_vehicles[new_id] = {
                     'id': new_id,
                     'type': 'car' if class_id == 2 else 'truck',
-                    'last_position': (cx, cy, frame_time),
-                    'positions': [(cx, cy, frame_time)],
-                    'speed_history': [],
-                    'matched': True,
+                    'positions': deque([(cx, cy, frame_time)], maxlen=POSITION_HISTORY),
+                    'speed_history': deque(maxlen=SPEED_SMOOTHING_WINDOW),
                     'alerted': False,
                     'confidence': conf
                 }
 
-        # Keep unmatched vehicles only if updated recently (3 seconds)
-        for vid, v in self.tracked_vehicles.items():
-            if not v['matched'] and frame_time - v['last_position'][2] < 3.0:
-                updated_vehicles[vid] = v
+        # Move matched rows to their new position; keep unmatched vehicles only if
+        # updated recently (3 seconds) and append a row per new vehicle
+        rows = matches[matched]
+        last_positions = self.last_positions.copy()
+        last_positions[rows, :2] = centroids[matched]
+        last_positions[rows, 2] = frame_time
+        keep = frame_time - last_positions[:, 2] < 3.0
+
+        for vid in self.track_ids[~keep].tolist():
+            del self.tracked_vehicles[vid]
 
-        self.tracked_vehicles = updated_vehicles
+        new_rows = np.column_stack((centroids[~matched], np.full(len(new_ids), frame_time)))
+        self.last_positions = np.concatenate((last_positions[keep], new_rows))
+        self.track_ids = np.concatenate((self.track_ids[keep], np.array(new_ids, dtype=np.int64)))
         return results
 
 
-# ---------- Video Processing Function ----------
-def process_video_clip(video_path: str) -> dict:
-    """Process a video clip and return vehicle tracking results"""
-    logger.info(f"Starting video processing: {video_path}")
+# ---------- Detection ----------
+def select_dnn_target(net):
+    """Run YOLO on a CUDA GPU or OpenCL device when available, otherwise on the CPU"""
+    try:
+        if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA_FP16)
+            logger.info("YOLO inference target: CUDA (FP16)")
+            return
+    except cv2.error as e:
+        logger.warning("CUDA unavailable, falling back: %s", e)
+
+    # OpenCL only pays off on a GPU, and OpenCV DNN runs FP16 kernels only on Intel GPUs;
+    # elsewhere it would silently fall back, so pick the target the device really runs
+    if cv2.ocl.haveOpenCL():
+        device = cv2.ocl.Device.getDefault()
+        if device.available() and device.type() & cv2.ocl.DEVICE_TYPE_GPU:
+            cv2.ocl.setUseOpenCL(True)
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            if device.isIntel():
+                net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL_FP16)
+                logger.info("YOLO inference target: OpenCL on %s (FP16)", device.name())
+            else:
+                net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL)
+                logger.info("YOLO inference target: OpenCL on %s", device.name())
+            return
+
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    logger.info("YOLO inference target: CPU")
+
+
+# Loaded networks are kept across invocations. A cv2.dnn.Net is not safe to share
+# between threads, so each concurrently processed video borrows its own from the pool.
+_net_pool = queue.Queue()
+
+
+def acquire_net() -> tuple:
+    """Borrow a (net, output_layers) pair from the pool, loading YOLOv3-tiny if none is free"""
+    try:
+        return _net_pool.get_nowait()
+    except queue.Empty:
+        pass
 
-    # Load YOLOv3-tiny model
     base_dir = os.path.dirname(__file__)
     net = cv2.dnn.readNet(
         os.path.join(base_dir, "yolov3-tiny.weights"),
         os.path.join(base_dir, "yolov3-tiny.cfg")
     )
+    select_dnn_target(net)
     layer_names = net.getLayerNames()
-    output_layers = [layer_names[i - 1] for i in net.getUnconnectedOutLayers().flatten()]
+    output_layers = tuple(layer_names[i - 1] for i in net.getUnconnectedOutLayers().flatten())
+    logger.info("Loaded YOLOv3-tiny model")
+    return net, output_layers
+
+
+def release_net(model: tuple):
+    """Return a (net, output_layers) pair to the pool for the next video"""
+    _net_pool.put(model)
+
+
+def run_yolo(net, output_layers, frames) -> np.ndarray:
+    """
+    Run YOLO on a batch of frames
+    Returns:
+        Raw (batch, anchors, 85) network output
+    """
+    blob = cv2.dnn.blobFromImages(frames, 0.00392, YOLO_INPUT_SIZE, (0, 0, 0), True, crop=False)
+    net.setInput(blob)
+    # Each output is (rows, 85) for a single image and (batch, rows, 85) for a batch;
+    # join the output scales into one (batch, anchors, 85) array
+    return np.concatenate([o.reshape(len(frames), -1, o.shape[-1]) for o in net.forward(output_layers)], axis=1)
+
+
+def decode_detections(out, width, height) -> list:
+    """
+    Decode raw YOLO output for a batch of frames
+    Returns:
+        One list of (x,y,w,h,confidence,class_id) car/truck detections per frame
+    """
+    # Best class and its score for every anchor, keeping confident cars and trucks
+    scores = out[..., 5:]
+    class_ids = scores.argmax(axis=2)
+    confidences = np.take_along_axis(scores, class_ids[..., None], axis=2)[..., 0]
+    keep = (confidences > CONFIDENCE) & CLASS_MASK[class_ids]
+    box_scale = np.array([width, height, width, height], dtype=np.float32)
+
+    batch_detections = []
+    for i in range(len(out)):
+        cx, cy, w, h = (out[i, keep[i], :4] * box_scale).astype(np.int32).T
+        boxes = np.stack([(cx - w / 2).astype(np.int32), (cy - h / 2).astype(np.int32), w, h], axis=1)
+        frame_confidences = confidences[i, keep[i]]
+
+        # Neighbouring anchors fire on the same vehicle; keep only the strongest box
+        # so duplicates do not spawn extra tracked vehicles
+        nms = np.asarray(cv2.dnn.NMSBoxes(boxes, frame_confidences, CONFIDENCE, NMS_THRESHOLD),
+                         dtype=np.intp).reshape(-1)
+        x, y, w, h = boxes[nms].T
+        batch_detections.append(list(zip(
+            x.tolist(), y.tolist(), w.tolist(), h.tolist(),
+            frame_confidences[nms].tolist(), class_ids[i, keep[i]][nms].tolist()
+        )))
+    return batch_detections
+
 
-    # Open video file
-    cap = cv2.VideoCapture(video_path)
+# ---------- Pipeline Stages ----------
+# Stages pass (frames or raw YOLO output, frame_times, moving) batches downstream, where
+# moving flags the frames that go through YOLO; None marks the end of the video and an
+# exception instance marks a failed stage.
+def _put(q, item, stop) -> bool:
+    """Put an item on a bounded queue, giving up if the pipeline was stopped"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    """Get an item from a queue, returning None if the pipeline was stopped"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+def read_frames(cap, fps, total_frames, duration, free_batches, read_q, stop):
+    """Reader stage: retrieve about ANALYSIS_FPS frames per second into pooled, network-sized batch buffers"""
+    try:
+        frame_stride = max(1, round(fps / ANALYSIS_FPS))
+        frame_count = 0
+        progress_interval = max(1, int(fps * 10))
+        frame = None  # full-resolution BGR frame, reused across retrieve() calls
+        bg_sub = cv2.createBackgroundSubtractorMOG2(history=500, detectShadows=False)
+        motion_pixels = MOTION_THRESHOLD * YOLO_INPUT_SIZE[0] * YOLO_INPUT_SIZE[1]
+        analysed_count = 0
+        frames, frame_times, moving = None, [], []
+        while not stop.is_set():
+            # grab() demuxes and decodes every frame; only every frame_stride-th frame is
+            # retrieve()d, so skipped frames avoid the colour conversion, resize and analysis
+            if not cap.grab():
+                break
+
+            frame_count += 1
+            current_time = frame_count / fps
+
+            # Log progress every 10 seconds
+            if frame_count % progress_interval == 0:
+                logger.info("Progress: %d/%d frames (%.1f/%.1fs)", frame_count, total_frames, current_time, duration)
+
+            if frame_count % frame_stride:
+                continue
+
+            # Waiting for a free buffer applies back-pressure from the detector
+            if frames is None:
+                frames = _get(free_batches, stop)
+                if frames is None:
+                    return
+
+            ret, frame = cap.retrieve(frame)
+            if not ret:
+                break
+
+            # Resize to the network input here, into the pooled buffer, so the
+            # detector's blobFromImages does no resizing and queued frames stay small
+            slot = sum(moving)
+            frames[slot] = cv2.resize(frame, YOLO_INPUT_SIZE, dst=frames[slot], interpolation=cv2.INTER_LINEAR)
+
+            # A frame with almost no foreground has no vehicle to detect: it keeps its
+            # time so the tracker still ages vehicles, but its slot is reused
+            foreground = cv2.countNonZero(bg_sub.apply(frames[slot]))
+            moving.append(analysed_count < MOTION_WARMUP or foreground >= motion_pixels)
+            analysed_count += 1
+            frame_times.append(current_time)
+
+            if len(frame_times) == DETECTION_BATCH_SIZE:
+                if not _put(read_q, (frames, frame_times, moving), stop):
+                    return
+                frames, frame_times, moving = None, [], []
+
+        if frame_times:
+            _put(read_q, (frames, frame_times, moving), stop)
+        _put(read_q, None, stop)
+    except Exception as e:
+        _put(read_q, e, stop)
+
+
+def detect_frames(net, output_layers, free_batches, read_q, detect_q, stop):
+    """Detector stage: run YOLO on each batch and hand its buffers back to the reader"""
+    while True:
+        item = _get(read_q, stop)
+        if item is None or isinstance(item, Exception):
+            _put(detect_q, item, stop)
+            return
+
+        frames, frame_times, moving = item
+        try:
+            n_moving = sum(moving)
+            out = run_yolo(net, output_layers, frames[:n_moving]) if n_moving else None
+        except Exception as e:
+            _put(detect_q, e, stop)
+            return
+        free_batches.put(frames)
+
+        if not _put(detect_q, (out, frame_times, moving), stop):
+            return
+
+
+# ---------- Video Processing Function ----------
+def process_video_clip(video_path: str) -> dict:
+    """Process a video clip and return vehicle tracking results"""
+    logger.info("Starting video processing: %s", video_path)
+
+    # Borrow a loaded model before opening the video, so a model load failure
+    # leaves no capture open
+    model = acquire_net()
+    net, output_layers = model
+
+    # Open video file, letting FFmpeg use a hardware decoder when one is available
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG,
+                           [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
     if not cap.isOpened():
+        release_net(model)
         raise ValueError(f"Could not open video: {video_path}")
 
     # Get video properties
     fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps <= 0:
+        cap.release()
+        release_net(model)
+        raise ValueError(f"Invalid frame rate {fps} for video: {video_path}")
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     duration = total_frames / fps
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
 
-    logger.info(f"Video properties - {width}x{height} @ {fps:.1f}fps, Duration: {duration:.1f}s, Frames: {total_frames}")
+    logger.info("Video properties - %dx%d @ %.1ffps, Duration: %.1fs, Frames: %d",
+                width, height, fps, duration, total_frames)
 
     # Initialize tracker and results structure
     tracker = VehicleTracker()
@@ -180,59 +451,57 @@ def process_video_clip(video_path: str) -> dict:
         }
     }
 
-    # Process each frame
-    frame_count = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame_count += 1
-        current_time = frame_count / fps
-
-        # Detect vehicles using YOLO
-        blob = cv2.dnn.blobFromImage(frame, 0.00392, (416, 416), (0, 0, 0), True, crop=False)
-        net.setInput(blob)
-        outs = net.forward(output_layers)
-
-        # Process detections (only cars and trucks)
-        detections = []
-        for out in outs:
-            for detection in out:
-                scores = detection[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-
-                if confidence > CONFIDENCE and class_id in [2, 7]:  # Only cars (2) and trucks (7)
-                    cx = int(detection[0] * width)
-                    cy = int(detection[1] * height)
-                    w = int(detection[2] * width)
-                    h = int(detection[3] * height)
-                    x = int(cx - w / 2)
-                    y = int(cy - h / 2)
-                    detections.append((x, y, w, h, confidence, class_id))
-
-        # Update tracker with new detections
-        tracked_vehicles = tracker.update(detections, current_time, height)
-        results["vehicles"].extend(tracked_vehicles)
-
-        # Log progress every 10 seconds
-        if frame_count % int(fps * 10) == 0:
-            logger.info(f"Progress: {frame_count}/{total_frames} frames ({current_time:.1f}/{duration:.1f}s)")
+    # Process frames in a three-stage pipeline: a reader thread decodes, a detector
+    # thread only runs the YOLO forward pass and this thread decodes its output and
+    # tracks. Bounded queues and a fixed pool of batch buffers keep memory flat.
+    stop = threading.Event()
+    read_q = queue.Queue(maxsize=PIPELINE_DEPTH)
+    detect_q = queue.Queue(maxsize=PIPELINE_DEPTH)
+    free_batches = queue.Queue()
+    for _ in range(PIPELINE_DEPTH + 2):  # one being filled, queued ones, one being detected
+        free_batches.put([None] * DETECTION_BATCH_SIZE)
+
+    stages = [
+        threading.Thread(target=read_frames, daemon=True,
+                         args=(cap, fps, total_frames, duration, free_batches, read_q, stop)),
+        threading.Thread(target=detect_frames, daemon=True,
+                         args=(net, output_layers, free_batches, read_q, detect_q, stop)),
+    ]
+    for stage in stages:
+        stage.start()
+
+    best_per_id = {}
+    try:
+        while True:
+            item = detect_q.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            # Decode the raw YOLO output here, off the detector thread, then update
+            # the tracker in frame order, keeping only the max speed record per vehicle.
+            # Frames that skipped YOLO update with no detections.
+            out, frame_times, moving = item
+            batch_detections = iter(decode_detections(out, width, height) if out is not None else [])
+            for frame_time, is_moving in zip(frame_times, moving):
+                detections = next(batch_detections) if is_moving else []
+                for vehicle in tracker.update(detections, frame_time, height):
+                    best = best_per_id.get(vehicle['id'])
+                    if best is None or vehicle['speed'] > best['speed']:
+                        best_per_id[vehicle['id']] = vehicle
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+        release_net(model)
+        cap.release()
 
     # Finalize results
-    cap.release()
     results["processing_end"] = datetime.utcnow().isoformat()
     proc_time = (datetime.utcnow() - datetime.fromisoformat(results["processing_start"])).total_seconds()
     
-    # Filter to only keep max speed per vehicle
-    unique_vehicles = {}
-    for vehicle in results["vehicles"]:
-        vid = vehicle['id']
-        if vid not in unique_vehicles or vehicle['speed'] > unique_vehicles[vid]['speed']:
-            unique_vehicles[vid] = vehicle
-    
-    results["vehicles"] = list(unique_vehicles.values())
-    
-    logger.info(f"Processing completed. {len(results['vehicles'])} unique vehicles in {proc_time:.1f}s")
+    results["vehicles"] = list(best_per_id.values())
+
+    logger.info("Processing completed. %d unique vehicles in %.1fs", len(results["vehicles"]), proc_time)
     return results
\ No newline at end of file
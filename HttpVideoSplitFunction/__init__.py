@@ -2,10 +2,37 @@ import logging
 import azure.functions as func
 import subprocess
 import os
+import functools
+import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from azure.storage.blob import BlobServiceClient
+from shared_code.storage import pooled_transport
 
+DOWNLOAD_CONCURRENCY = 4   # parallel range requests for the source video download
+UPLOAD_CONCURRENCY = 4     # parallel block uploads per split file
+UPLOAD_WORKERS = 8         # split files uploaded concurrently
+# every concurrent block upload needs its own connection to keep it alive for reuse
+CONNECTION_POOL_SIZE = max(UPLOAD_WORKERS * UPLOAD_CONCURRENCY, DOWNLOAD_CONCURRENCY)
+
+# The storage client is cached across invocations so its connection pool is reused
+_blob_service = None
+_client_lock = threading.Lock()
+
+def get_blob_service() -> BlobServiceClient:
+    """Return the shared Blob Service Client, creating it on first use"""
+    global _blob_service
+    with _client_lock:
+        if _blob_service is None:
+            _blob_service = BlobServiceClient.from_connection_string(
+                os.environ["AzureWebJobsStorage"],
+                transport=pooled_transport(CONNECTION_POOL_SIZE)
+            )
+    return _blob_service
+
+@functools.lru_cache(maxsize=1)
 def get_ffmpeg_path():
-    """Locate FFmpeg binary with fallback paths"""
+    """Locate FFmpeg binary with fallback paths (resolved once per worker)"""
     try:
         subprocess.run(["ffmpeg", "-version"], check=True,
                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -19,6 +46,26 @@ def get_ffmpeg_path():
             return local_path
         raise Exception("FFmpeg not found in any expected locations")
 
+def upload_split(container_client, file_path: str):
+    """Upload one split file and remove it from local storage"""
+    file = os.path.basename(file_path)
+    with open(file_path, "rb") as data:
+        container_client.upload_blob(name=file, data=data, overwrite=True,
+                                     length=os.path.getsize(file_path),
+                                     max_concurrency=UPLOAD_CONCURRENCY)
+    os.remove(file_path)
+    logging.info(f"Uploaded {file}")
+
+def discard_splits(container_client, uploaded: list, output_prefix: str):
+    """Delete the segments uploaded by a failed run and any split files left on local storage"""
+    for name in uploaded:
+        try:
+            container_client.delete_blob(name)
+        except Exception as e:
+            logging.error(f"Failed to delete {name}: {str(e)}")
+    for file_path in glob.glob(f"{output_prefix}*.mp4"):
+        os.remove(file_path)
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Video split function triggered.')
 
@@ -33,9 +80,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     output_prefix = f"{temp_dir}/split_"
 
     try:
-        # 1. Initialize Blob Service Client
-        connection_string = os.environ["AzureWebJobsStorage"]
-        blob_service = BlobServiceClient.from_connection_string(connection_string)
+        # 1. Get the shared Blob Service Client
+        blob_service = get_blob_service()
 
         # 2. Create /tmp directory if it doesn't exist
         os.makedirs(temp_dir, exist_ok=True)
@@ -44,18 +90,25 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         logging.info(f"Downloading {input_blob_name} from {input_container}")
         blob_client = blob_service.get_blob_client(container=input_container, blob=input_blob_name)
         
+        # Stream straight to disk instead of holding the whole video in memory
         with open(input_video, "wb") as video_file:
-            download_stream = blob_client.download_blob()
-            video_file.write(download_stream.readall())
+            download_stream = blob_client.download_blob(max_concurrency=DOWNLOAD_CONCURRENCY)
+            download_stream.readinto(video_file)
         logging.info("Download completed successfully")
 
         # 4. Get FFmpeg path and verify
         ffmpeg_cmd = get_ffmpeg_path()
         logging.info(f"Using FFmpeg at: {ffmpeg_cmd}")
 
-        # 5. Split video using FFmpeg
+        # 5. Split video using FFmpeg and upload each segment as soon as it is closed.
+        # FFmpeg prints every finished segment's file name to the segment list on
+        # stdout, so uploads overlap with the rest of the split.
+        output_container_client = blob_service.get_container_client(output_container)
+
         logging.info("Starting video splitting process")
-        subprocess.run([
+        uploaded = []
+        failed = []
+        with subprocess.Popen([
             ffmpeg_cmd,
             "-i", input_video,
             "-c", "copy",
@@ -63,20 +116,35 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             "-segment_time", segment_time,
             "-f", "segment",
             "-reset_timestamps", "1",
+            "-avoid_negative_ts", "make_zero",
+            "-segment_format_options", "movflags=+faststart",
+            "-segment_list", "pipe:1",
+            "-segment_list_type", "flat",
             f"{output_prefix}%03d.mp4"
-        ], check=True)
-        logging.info("Video split completed")
+        ], stdout=subprocess.PIPE, text=True) as ffmpeg, \
+                ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            # 6. Upload split files to output container
+            uploads = {executor.submit(upload_split, output_container_client, f"{temp_dir}/{name}"): name
+                       for name in (line.strip() for line in ffmpeg.stdout) if name}
+            returncode = ffmpeg.wait()
 
-        # 6. Upload split files to output container
-        output_container_client = blob_service.get_container_client(output_container)
-        
-        for file in os.listdir(temp_dir):
-            if file.startswith("split_") and file.endswith(".mp4"):
-                file_path = f"{temp_dir}/{file}"
-                with open(file_path, "rb") as data:
-                    output_container_client.upload_blob(name=file, data=data)
-                os.remove(file_path)
-                logging.info(f"Uploaded {file}")
+            # Wait for every upload, logging each failure, before deciding the outcome
+            for upload, name in uploads.items():
+                try:
+                    upload.result()
+                    uploaded.append(name)
+                except Exception as e:
+                    logging.error(f"Failed to upload {name}: {str(e)}")
+                    failed.append(name)
+
+        # A failed run publishes nothing: downstream processing must never see a
+        # truncated split set
+        if returncode != 0 or failed:
+            discard_splits(output_container_client, uploaded, output_prefix)
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, ffmpeg.args)
+            raise Exception(f"Failed to upload {len(failed)} split files")
+        logging.info("Video split completed")
 
         # 7. Clean up
         if os.path.exists(input_video):
@@ -0,0 +1,28 @@
+import requests
+from urllib3.util.retry import Retry
+from azure.core.pipeline.transport import RequestsTransport
+
+SEND_BLOCK_SIZE = 32768  # socket send size azure-core's own adapter uses for uploads
+
+
+class PooledHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter that sends request bodies in SEND_BLOCK_SIZE blocks"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("blocksize", SEND_BLOCK_SIZE)
+        super().init_poolmanager(*args, **kwargs)
+
+
+def pooled_transport(pool_size: int, **kwargs) -> RequestsTransport:
+    """
+    Build an Azure SDK transport whose session keeps pool_size connections per host
+    Passing our own session skips azure-core's session setup, so this mirrors it:
+    retries are left to the SDK's retry policy and redirects are not followed.
+    Extra kwargs (e.g. connection_timeout, read_timeout) go to RequestsTransport.
+    """
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                                max_retries=Retry(total=False, redirect=False, raise_on_status=False))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(session=session, **kwargs)